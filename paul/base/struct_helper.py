@@ -103,6 +103,15 @@ class Structure (struct.Struct):
         # See http://docs.python.org/library/struct for details
         self.name = name
         self.fields = fields
+        # the field names and whether any field needs (un)flattening
+        # are needed on every unpack, so we figure them out only once
+        self._names = tuple([f.name for f in fields])
+        self._flat = all([f.total_count == 1 for f in fields])
+        # format string without the byte order character
+        format = []
+        for field in fields:
+            format.extend([field.format]*field.total_count)
+        self._raw_format = ''.join(format).replace('P', 'L')
         self.set_byte_order(byte_order)
 
     def __str__(self):
@@ -114,10 +123,7 @@ class Structure (struct.Struct):
         if (hasattr(self, 'format') and self.format != None
             and self.format.startswith(byte_order)):
             return  # no need to change anything
-        format = []
-        for field in self.fields:
-            format.extend([field.format]*field.total_count)
-        struct.Struct.__init__(self, format=byte_order+''.join(format).replace('P', 'L'))
+        struct.Struct.__init__(self, format=byte_order+self._raw_format)
 
     def _flatten_args(self, args):
         # handle Field.count > 0
@@ -131,6 +137,8 @@ class Structure (struct.Struct):
 
     def _unflatten_args(self, args):
         # handle Field.count > 0
+        if self._flat:
+            return list(args)
         unflat_args = []
         i = 0
         for f in self.fields:
@@ -177,9 +185,7 @@ class Structure (struct.Struct):
             struct.Struct.unpack_from(self, buffer, offset))
 
     def unpack_dict(self, string):
-        return dict(list(zip([f.name for f in self.fields],
-                        self.unpack(string))))
+        return dict(zip(self._names, self.unpack(string)))
 
     def unpack_dict_from(self, buffer, offset=0):
-        return dict(list(zip([f.name for f in self.fields],
-                        self.unpack_from(buffer, offset))))
+        return dict(zip(self._names, self.unpack_from(buffer, offset)))
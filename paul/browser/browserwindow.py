@@ -10,7 +10,33 @@ import os.path
 import logging
 log = logging.getLogger (__name__)
 
+class _LoadTask (QtCore.QRunnable):
+    '''
+    Loads a list of wave files in a worker thread (see
+    *ViewerWindow.loadFile()*), and reports the result
+    via *signal* as (generation, file list, waves, error).
+    '''
+    def __init__ (self, gen, flist, signal):
+        QtCore.QRunnable.__init__(self)
+        self.gen = gen
+        self.flist = list(flist)
+        self.signal = signal
+
+    def run (self):
+        try:
+            data = [ ViewerWindow.loadFile(f) for f in self.flist ]
+        except Exception as e:
+            self.signal.emit (self.gen, self.flist, None, str(e))
+            return
+        self.signal.emit (self.gen, self.flist, data, '')
+
+
 class BrowserWindow (QtGui.QMainWindow):
+
+    # Signal emitted (from a worker thread) when waves were loaded,
+    # parameters are (generation, file list, waves, error string).
+    wavesLoaded = QtCore.pyqtSignal (int, object, object, str)
+
     def __init__ (self, start_path='~'):
         QtGui.QMainWindow.__init__(self)
         self.setWindowTitle ("Paul Browser")
@@ -18,18 +44,18 @@ class BrowserWindow (QtGui.QMainWindow):
 
         # create UI elements
         self.initMainFrame()
-        self.initBrowser()
+        self.initBrowser(start_path)
         self.initViewer()
         self.initRootPwd()
 
         # start synchronizing the current working directory with self.root
         self.rootpwd = True
 
-        # inter-component connections
-        self.tree.wavesSelected.connect(self.viewer.plotFiles)
-
-        # move to default start directory
-        self.tree.setRoot (start_path)
+        # inter-component connections: waves are loaded in a worker
+        # thread, and passed on to the viewer when ready
+        self._load_gen = 0
+        self.tree.wavesSelected.connect(self.loadFiles)
+        self.wavesLoaded.connect(self.plotLoaded)
 
 
     def initMainFrame(self):
@@ -43,9 +69,10 @@ class BrowserWindow (QtGui.QMainWindow):
         self.hbox.addWidget (self.splitter)
 
 
-    def initBrowser(self):
-        # model for the file system (dir tree)
-        self.tree = TreeWindow()
+    def initBrowser(self, start_path='~'):
+        # model for the file system (dir tree); the tree window
+        # moves to the start directory by itself.
+        self.tree = TreeWindow(start_path)
         self.tree.setParent (self.splitter)
 
 
@@ -55,9 +82,32 @@ class BrowserWindow (QtGui.QMainWindow):
 
 
     @QtCore.pyqtSlot('QStringList')
-    def plotFiles(wfiles):
-        # ...
-        pass
+    def loadFiles(self, flist):
+        '''
+        Loads the files *flist* in a worker thread. Results
+        of previously started, still running loads will be discarded.
+        '''
+        self._load_gen += 1
+        if len(flist) == 0:
+            # nothing to load; let the viewer decide what to display
+            self.viewer.plotFiles (flist)
+            return
+        QtCore.QThreadPool.globalInstance().start (_LoadTask (self._load_gen, flist,
+                                                              self.wavesLoaded))
+
+
+    @QtCore.pyqtSlot(int, object, object, str)
+    def plotLoaded(self, gen, flist, data, err):
+        '''
+        Called when a worker thread has finished loading waves.
+        '''
+        if gen != self._load_gen:
+            log.debug ("Discarding stale load of %s", flist)
+            return
+        if data is None:
+            log.error ("Error loading %s: %s", flist, err)
+            return
+        self.viewer.plotLoaded (flist, data)
 
     def initRootPwd(self):
         '''
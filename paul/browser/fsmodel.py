@@ -0,0 +1,322 @@
+from PyQt4 import QtCore, QtGui
+
+import os, time
+import logging
+log = logging.getLogger (__name__)
+
+#
+# A lightweight, lazy replacement for QFileSystemModel.
+#
+# QFileSystemModel stat()s every entry of a directory (and installs
+# watchers, resolves icons etc) as soon as the directory is touched,
+# which takes ages on large or networked directories. The model below
+# populates a directory only when the view actually asks for its
+# children (canFetchMore() / fetchMore()), and does so with a single
+# os.scandir() pass, the DirEntry objects of which already know
+# whether they're files or directories.
+#
+# The part of the QFileSystemModel API that is used by the browser
+# (index(path), filePath(), fileInfo()) is emulated.
+#
+
+class FsEntry (object):
+    '''
+    One file system entry as seen by IbwFsModel. Also doubles as
+    a (very) small subset of QFileInfo, so that fileInfo() users
+    don't need to care which model they're talking to.
+    '''
+    __slots__ = ('name', 'path', 'is_dir', '_stat', 'parent', 'row')
+
+    def __init__ (self, name, path, is_dir, parent=None, row=0):
+        self.name   = name
+        self.path   = path
+        self.is_dir = is_dir
+        self.parent = parent
+        self.row    = row
+        self._stat  = None
+
+    # size and modification time are only needed for the rows the
+    # view actually displays, so we stat() on first access.
+    def _getstat (self):
+        if self._stat is None:
+            try:
+                self._stat = os.stat (self.path)
+            except OSError:
+                self._stat = os.stat_result ((0,)*10)
+        return self._stat
+
+    @property
+    def size (self):
+        return self._getstat().st_size
+
+    @property
+    def mtime (self):
+        return self._getstat().st_mtime
+
+    # QFileInfo-like interface
+    def isDir (self):
+        return self.is_dir
+
+    def isFile (self):
+        return not self.is_dir
+
+    def isReadable (self):
+        return os.access (self.path, os.R_OK)
+
+    def fileName (self):
+        return self.name
+
+    def absoluteFilePath (self):
+        return self.path
+
+
+class IbwFsModel (QtCore.QAbstractItemModel):
+
+    columns = ("Name", "Size", "Type", "Date Modified")
+
+    # Regular files are only displayed if their name ends in this
+    # (compared case-insensitively; directories are always displayed).
+    # A plain suffix check is all we need, no pattern matching.
+    suffix = '.ibw'
+
+    def __init__ (self, parent=None):
+        QtCore.QAbstractItemModel.__init__(self, parent)
+
+        # The invisible root item has exactly one child, the file system
+        # root (that's the way QFileSystemModel does it, too).
+        # Directory listings are cached in _children, keyed by absolute
+        # path; a directory which is not in there has not been fetched yet.
+        self._root = FsEntry ('', '', True)
+        self._children = { '': [ FsEntry ('/', '/', True, self._root) ] }
+
+        # One folder and one file icon for all entries (per-file icon
+        # lookup is expensive, in particular on network file systems).
+        # Created on first use (needs a running QApplication).
+        self._icons = None
+
+        # current sort order (see sort()), also applied to
+        # directories that are fetched later on
+        self._sort_column = 0
+        self._sort_order  = QtCore.Qt.AscendingOrder
+
+
+    def _scan (self, parent):
+        '''
+        Reads the directory *parent* (an FsEntry) from disk and returns
+        a sorted list of FsEntry objects (directories first).
+        The file type comes with the directory listing itself, so
+        there's no extra stat() per entry here.
+        '''
+        entries = []
+        suffix, n = self.suffix, -len(self.suffix)
+        try:
+            with os.scandir (parent.path) as it:
+                for e in it:
+                    if e.name.startswith('.'):
+                        continue  # hidden, as with QFileSystemModel's default filter
+                    if e.is_dir():
+                        entries.append (FsEntry (e.name, e.path, True, parent))
+                    elif e.name[n:].lower() == suffix:
+                        entries.append (FsEntry (e.name, e.path, False, parent))
+        except OSError as ex:
+            log.debug ("Cannot list %s: %s", parent.path, ex)
+
+        self._sort_entries (entries)
+        return entries
+
+
+    def _sort_entries (self, entries):
+        '''
+        Sorts *entries* in-place by the current sort column and order
+        (directories are always kept on top), and updates their rows.
+        '''
+        keys = [ lambda e: e.name.lower(),
+                 lambda e: e.size,
+                 lambda e: os.path.splitext(e.name)[1].lower(),
+                 lambda e: e.mtime ]
+        key = keys[self._sort_column] if self._sort_column < len(keys) else keys[0]
+        entries.sort (key=key, reverse=(self._sort_order == QtCore.Qt.DescendingOrder))
+        entries.sort (key=lambda e: not e.is_dir)
+        for i, e in enumerate(entries):
+            e.row = i
+
+
+    def _entry (self, index):
+        if not index.isValid():
+            return self._root
+        return index.internalPointer()
+
+
+    #
+    # lazy population
+    #
+
+    def hasChildren (self, parent=QtCore.QModelIndex()):
+        entry = self._entry (parent)
+        if not entry.is_dir:
+            return False
+        if entry.path not in self._children:
+            return True
+        return len(self._children[entry.path]) > 0
+
+
+    def canFetchMore (self, parent):
+        entry = self._entry (parent)
+        return entry.is_dir and entry.path not in self._children
+
+
+    def fetchMore (self, parent):
+        entry = self._entry (parent)
+        if not self.canFetchMore (parent):
+            return
+        entries = self._scan (entry)
+        if len(entries) == 0:
+            self._children[entry.path] = entries
+            return
+        self.beginInsertRows (parent, 0, len(entries)-1)
+        self._children[entry.path] = entries
+        self.endInsertRows()
+
+
+    #
+    # QAbstractItemModel interface
+    #
+
+    def rowCount (self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self._children.get(self._entry(parent).path, []))
+
+
+    def columnCount (self, parent=QtCore.QModelIndex()):
+        return len(self.columns)
+
+
+    def index (self, *args):
+        '''
+        Either index(row, column, parent) as in QAbstractItemModel, or
+        index(path, column=0) as in QFileSystemModel.
+        '''
+        if isinstance (args[0], str):
+            return self._pathIndex (*args)
+
+        row, column = args[0], args[1]
+        parent = args[2] if len(args) > 2 else QtCore.QModelIndex()
+        entries = self._children.get(self._entry(parent).path, [])
+        if row < 0 or row >= len(entries) or column < 0 or column >= len(self.columns):
+            return QtCore.QModelIndex()
+        return self.createIndex (row, column, entries[row])
+
+
+    def _pathIndex (self, path, column=0):
+        '''
+        Returns the index of *path*, fetching all directories
+        along the way if necessary.
+        '''
+        path = os.path.abspath (path)
+        index = self.index (0, 0, QtCore.QModelIndex())  # the "/" entry
+        for part in [p for p in path.split(os.sep) if len(p)]:
+            if self.canFetchMore (index):
+                self.fetchMore (index)
+            entries = self._children.get(self._entry(index).path, [])
+            match = [e for e in entries if e.name == part]
+            if len(match) == 0:
+                return QtCore.QModelIndex()
+            index = self.createIndex (match[0].row, 0, match[0])
+        if column != 0:
+            index = index.sibling (index.row(), column)
+        return index
+
+
+    def parent (self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        p = index.internalPointer().parent
+        if p is None or p is self._root:
+            return QtCore.QModelIndex()
+        return self.createIndex (p.row, 0, p)
+
+
+    def data (self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        e = index.internalPointer()
+        col = index.column()
+        if role == QtCore.Qt.DecorationRole and col == 0:
+            if self._icons is None:
+                provider = QtGui.QFileIconProvider()
+                self._icons = (provider.icon (QtGui.QFileIconProvider.Folder),
+                               provider.icon (QtGui.QFileIconProvider.File))
+            return self._icons[0] if e.is_dir else self._icons[1]
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if col == 0:
+            return e.name
+        elif col == 1:
+            return '' if e.is_dir else _fmt_size (e.size)
+        elif col == 2:
+            return "Folder" if e.is_dir else "%s File" % os.path.splitext(e.name)[1][1:]
+        elif col == 3:
+            return time.strftime ("%Y-%m-%d %H:%M", time.localtime(e.mtime))
+        return None
+
+
+    def headerData (self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.columns[section]
+        return None
+
+
+    def flags (self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+
+    def sort (self, column, order=QtCore.Qt.AscendingOrder):
+        '''
+        Sorts all fetched directory listings by *column*
+        (directories are always kept on top). Directories fetched
+        later on are sorted the same way.
+        '''
+        self._sort_column = column
+        self._sort_order  = order
+
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        for entries in self._children.values():
+            self._sort_entries (entries)
+        self.changePersistentIndexList (old, [ self.createIndex (i.internalPointer().row,
+                                                                 i.column(),
+                                                                 i.internalPointer())
+                                               for i in old ])
+        self.layoutChanged.emit()
+
+
+    #
+    # QFileSystemModel compatibility
+    #
+
+    def filePath (self, index):
+        return self._entry(index).path
+
+
+    def fileInfo (self, index):
+        return self._entry(index)
+
+
+    def isDir (self, index):
+        return self._entry(index).is_dir
+
+
+def _fmt_size (size):
+    '''
+    Human readable file size, QFileSystemModel style.
+    '''
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if size < 1024.0 or unit == "GB":
+            break
+        size /= 1024.0
+    if unit == "bytes":
+        return "%d %s" % (size, unit)
+    return "%.1f %s" % (size, unit)
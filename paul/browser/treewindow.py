@@ -1,6 +1,7 @@
 from PyQt4 import QtGui, QtCore
 
 from paul.viewer.viewerwindow import ViewerWindow
+from paul.browser.fsmodel import IbwFsModel
 from matplotlib.backends.backend_qt4agg import NavigationToolbar2QTAgg as NavigationToolbar
 
 import os.path
@@ -20,15 +21,19 @@ class TreeWindow (QtGui.QMainWindow):
         # some variables
         self.current_path = ''
         self.selected_paths = []
+        self._parent_stack = [] # current_path and all its parents, root first
         self.set_root_pwd = False # if 'True', change into the Root directory
+        self._resize_pending = False # if 'True', a column resize is already scheduled
+        self._emit_pending = False   # if 'True', a wavesSelected signal is already scheduled
 
         # create UI elements
         self.initMainFrame()
         self.initToolbar()
         self.initTree()
 
-        # move to default start directory
-        self.setRoot (os.path.expanduser(start_path))
+        # move to default start directory -- but only once the event
+        # loop is running, so that the window gets painted first.
+        QtCore.QTimer.singleShot (0, lambda: self.setRoot (os.path.expanduser(start_path)))
 
 
     def initMainFrame(self):
@@ -54,6 +59,11 @@ class TreeWindow (QtGui.QMainWindow):
                                            QtGui.QSizePolicy.Minimum)
         self.tools_treedrop.currentIndexChanged['QString'].connect (self.setRoot)
 
+        # recently visited root paths, most recent first (see treeMakeDrop()),
+        # at most _history_max of them
+        self._history = []
+        self._history_max = 20
+
         self.tools_btnUp = QtGui.QPushButton ("&Up")
         self.tools_btnUp.show()
         self.tools_btnUp.setSizePolicy (QtGui.QSizePolicy.Minimum,
@@ -73,18 +83,17 @@ class TreeWindow (QtGui.QMainWindow):
     def initTree(self):
         '''Initializes browser specific stuff (tree-view and buttons)'''
 
-        # model for the file system (dir tree)
-        self.filesys = QtGui.QFileSystemModel()
-        self.filesys.setRootPath(QtCore.QDir.currentPath())
-        self.filesys.setFilter (QtCore.QDir.AllDirs | QtCore.QDir.Dirs | QtCore.QDir.Files | QtCore.QDir.NoDotAndDotDot)
-        self.filesys.setNameFilters ("*.ibw")
-        self.filesys.setNameFilterDisables (False)
+        # model for the file system (dir tree), directories are
+        # read lazily as the tree view expands them
+        self.filesys = IbwFsModel()
 
         # the file system browser tree
         self.filetree = QtGui.QTreeView()
         self.vbox.addWidget (self.filetree)
         self.filetree.setSelectionMode (QtGui.QAbstractItemView.ExtendedSelection)
         self.filetree.setSortingEnabled (True)
+        self.filetree.setUniformRowHeights (True)
+        self.filetree.setAnimated (False)
         self.filetree.activated.connect(self.itemActivated)
         self.filetree.setModel (self.filesys)
         self.filetree.selectionModel().selectionChanged.connect(self.itemSelected)
@@ -99,32 +108,70 @@ class TreeWindow (QtGui.QMainWindow):
         (i.e. no entry will be changed in the path history dropdown).
         '''
 
-        new_path = os.path.abspath(os.path.expandvars(os.path.expanduser(str(path))))
-        if (os.path.abspath(new_path) == self.current_path):
+        # new_path is already absolute, no need to abspath() it again
+        # for the comparison. (Results are deliberately not cached:
+        # relative paths change their meaning with os.chdir(), which
+        # we do ourselves if set_root_pwd is enabled.)
+        new_path = os.path.expanduser(str(path))
+        if '$' in new_path:
+            new_path = os.path.expandvars (new_path)
+        new_path = os.path.abspath (new_path)
+        if (new_path == self.current_path):
             # this usually happens when we call setCurrentIndex() manually,
             # see below...
             return
 
         #self.statusBar().showMessage (self.current_path)
         index = self.filesys.index (new_path)
-        self.filetree.setRootIndex (index)
-        self.filetree.scrollTo (index)
+
+        # re-rooting and scrolling would trigger one repaint each;
+        # suppress intermediate paints and have the view redrawn once.
+        self.filetree.setUpdatesEnabled (False)
+        try:
+            self.filetree.setRootIndex (index)
+            self.filetree.scrollTo (index)
+        finally:
+            self.filetree.setUpdatesEnabled (True)
         self.current_path = str(self.filesys.filePath(index))
+        self._updateParents (self.current_path)
 
         if silent != 0:
             return
 
-        # add path to combo box and make the added entry the current one
-        combo_index = self.tools_treedrop.findText (self.current_path)
-        if combo_index < 0:
-            self.tools_treedrop.insertItem (0, self.current_path)
-            combo_index = 0
-        self.tools_treedrop.setCurrentIndex (combo_index)
+        # remember the path and rebuild the dropdown list
+        if self.current_path in self._history:
+            self._history.remove (self.current_path)
+        self._history.insert (0, self.current_path)
+        del self._history[self._history_max:]
+        self.treeMakeDrop()
         
         if self.set_root_pwd:
             os.chdir (self.current_path)
 
 
+    def _updateParents (self, path):
+        '''
+        Updates the parent chain of the current root to *path*.
+        Moving one level down or up any number of levels (the
+        usual case) doesn't need to take the path apart.
+        '''
+        stack = self._parent_stack
+        if len(stack) and os.path.dirname(path) == stack[-1]:
+            stack.append (path)
+            return
+        if path in stack:
+            del stack[stack.index(path)+1:]
+            return
+
+        stack[:] = [path]
+        while True:
+            parent = os.path.dirname (stack[-1])
+            if parent == stack[-1]:
+                break
+            stack.append (parent)
+        stack.reverse()
+
+
     def treeMakeDrop (self):
         '''
         Updates the tree dropdown list.
@@ -132,11 +179,22 @@ class TreeWindow (QtGui.QMainWindow):
         parent nodes from the currently displayed node (the root
         of the tree-view) to the root of the file system,
         for fast selection.
-        Additionally, the dropdown may contain recently selected
-        list items.
+        Additionally, the dropdown contains recently selected
+        root paths.
+        The list is rebuilt in one go, with signals blocked (otherwise
+        changing the current entry would call setRoot() again).
         '''
-        pass
-        
+        chain = self._parent_stack[::-1]
+        recent = [ p for p in self._history if p not in chain ]
+
+        drop = self.tools_treedrop
+        drop.blockSignals (True)
+        try:
+            drop.clear()
+            drop.addItems (chain + recent)
+            drop.setCurrentIndex (0)
+        finally:
+            drop.blockSignals (False)
 
         
     @QtCore.pyqtSlot()
@@ -145,8 +203,11 @@ class TreeWindow (QtGui.QMainWindow):
         Moves the root of the tree view one item up (i.e.
         sets the parent of the current root as the new root).
         '''
-        new_path = os.path.dirname(self.current_path)
-        log.debug ("Moving to parent: %s" % new_path)
+        if len(self._parent_stack) > 1:
+            new_path = self._parent_stack[-2]
+        else:
+            new_path = os.path.dirname(self.current_path)
+        log.debug ("Moving to parent: %s", new_path)
         self.setRoot (new_path)
 
     @QtCore.pyqtSlot()
@@ -158,16 +219,15 @@ class TreeWindow (QtGui.QMainWindow):
         embed()
 
 
-    @QtCore.pyqtSlot('QModelIndex')
-    def waveActivated (self, index):
+    def waveActivated (self, finfo):
         '''
         Called when an item is activated and that item is a
-        regular file (i.e. probably a wave).
+        regular file (i.e. probably a wave). *finfo* is the
+        file info object of the item, as returned by the model.
         If the item is a wave, it is loaded and plotted.
         '''
-        finfo = self.filesys.fileInfo(index)
-        fpath = self.filesys.filePath(index)
-        log.debug ("Activated file: %s" % fpath)
+        fpath = finfo.absoluteFilePath()
+        log.debug ("Activated file: %s", fpath)
 
 
     @QtCore.pyqtSlot('QModelIndex')
@@ -179,9 +239,9 @@ class TreeWindow (QtGui.QMainWindow):
         '''
         finfo = self.filesys.fileInfo(index)
         if finfo.isDir():
-            self.setRoot (str(self.filesys.filePath(index)))
-        if finfo.isFile() and finfo.isReadable():
-            self.waveActivated (index)
+            self.setRoot (str(finfo.absoluteFilePath()))
+        elif finfo.isFile() and finfo.isReadable():
+            self.waveActivated (finfo)
 
 
     # called when the selection changed in the waveList
@@ -199,33 +259,68 @@ class TreeWindow (QtGui.QMainWindow):
                  misbehave!
         '''
 
+        # The selection ranges contain one index per column and row;
+        # we're only interested in the rows (i.e. column 0).
+        changed = False
+
         # add *sel* to selected_paths
         for i in sel.indexes():
+            if i.column() != 0:
+                continue
             finfo = self.filesys.fileInfo(i)
-            fpath = self.filesys.filePath(i)
-            fpath_file = os.path.basename (str(fpath))
-            fpath_full = os.path.abspath (str(fpath))
-            if fpath not in self.selected_paths:
+            fpath_full = str(finfo.absoluteFilePath())
+            if fpath_full not in self.selected_paths:
                 if finfo.isFile():
-                    log.debug ("Selected file: %s" % str(fpath))
+                    log.debug ("Selected file: %s", fpath_full)
                     self.selected_paths.append (fpath_full)
+                    changed = True
                 elif finfo.isDir():
-                    log.debug ("Selected dir: %s" % str(fpath))
+                    log.debug ("Selected dir: %s", fpath_full)
                 else:
-                    log.debug ("...what to do with %s?" % str(fpath))
+                    log.debug ("...what to do with %s?", fpath_full)
 
         # remove *unsel* from selected_paths
         for i in unsel.indexes():
-            fpath = self.filesys.filePath(i)
-            fpath_file = os.path.basename (str(fpath))
-            fpath_full = os.path.abspath (str(fpath))
+            if i.column() != 0:
+                continue
+            fpath_full = str(self.filesys.fileInfo(i).absoluteFilePath())
             if fpath_full in self.selected_paths:
                 del self.selected_paths[self.selected_paths.index(fpath_full)]
+                changed = True
+
+        # Don't load files from within the selection handler: emit
+        # wavesSelected on the next event loop turn, and only for the
+        # selection as it is by then. This way, quickly moving through
+        # the list won't read every single file along the way.
+        # Nothing to emit if the set of selected files didn't change
+        # (e.g. only directories were (de)selected).
+        if changed and not self._emit_pending:
+            self._emit_pending = True
+            QtCore.QTimer.singleShot (0, self._flush_pending)
+
+        # Column width is adjusted on the next event loop turn, and only
+        # once, no matter how many selection changes come in until then.
+        if not self._resize_pending:
+            self._resize_pending = True
+            QtCore.QTimer.singleShot (0, self._do_resize)
 
-        self.wavesSelected.emit(self.selected_paths)
 
-        # if the column 0 (the one with the names) is too narrow,
-        # expand it to fit the names.
+    @QtCore.pyqtSlot()
+    def _flush_pending (self):
+        '''
+        Emits the wavesSelected signal for the current selection.
+        '''
+        self._emit_pending = False
+        self.wavesSelected.emit (self.selected_paths)
+
+
+    @QtCore.pyqtSlot()
+    def _do_resize (self):
+        '''
+        If the column 0 (the one with the names) is too narrow,
+        expand it to fit the names.
+        '''
+        self._resize_pending = False
         new_width = self.filetree.sizeHintForColumn (0)
         if (self.filetree.columnWidth(0) < new_width):
             self.filetree.setColumnWidth (0, new_width)
@@ -42,8 +42,9 @@ log = logging.getLogger (__name__)
 from paul.base.struct_helper import *
 from paul.base.wave import Wave
 from paul.base.errors import *
-from numpy import getbuffer, transpose, array
-import os, re, stat
+from numpy import transpose, array
+import os, re, stat, mmap
+from ast import literal_eval
 from pprint import pprint
 import errno
 
@@ -69,7 +70,7 @@ complexUInt32 = numpy.dtype([('real', numpy.uint32), ('imag', numpy.uint32)])
 # From IgorMath.h
 TYPE_TABLE = {       # (key: integer flag, value: numpy dtype)
     0:None,          # Text wave, not handled in ReadWave.c
-    1:numpy.complex, # NT_CMPLX, makes number complex.
+    1:complex,       # NT_CMPLX, makes number complex.
     2:numpy.float32, # NT_FP32, 32 bit fp numbers.
     3:numpy.complex64,
     4:numpy.float64, # NT_FP64, 64 bit fp numbers.
@@ -93,6 +94,16 @@ TYPE_TABLE = {       # (key: integer flag, value: numpy dtype)
     0x61:complexUInt32,
 }
 
+# dtype() wrapping (once, here) to avoid numpy.generic and
+# getset_descriptor issues with the builtin Numpy types
+# (e.g. int32).  It has no effect on our local complex
+# integers.
+TYPE_TABLE = dict((k, None if v is None else numpy.dtype(v))
+                  for k, v in TYPE_TABLE.items())
+
+# ...and the reverse (numpy dtype -> integer flag)
+TYPE_IDS = dict((v, k) for k, v in sorted(TYPE_TABLE.items()) if v is not None)
+
 # From wave.h
 MAXDIMS = 4
 
@@ -163,7 +174,7 @@ WaveHeader2 = Structure(
     fields=[
         Field('h', 'type', help='See types (e.g. NT_FP64) above. Zero for text waves.'),
         Field('P', 'next', default=0, help='Used in memory only. Write zero. Ignore on read.'),
-        Field('c', 'bname', help='Name of wave plus trailing null.', count=MAX_WAVE_NAME2+2),
+        Field('%ds' % (MAX_WAVE_NAME2+2), 'bname', help='Name of wave plus trailing null.'),
         Field('h', 'whVersion', default=0, help='Write 0. Ignore on read.'),
         Field('h', 'srcFldr', default=0, help='Used in memory only. Write zero. Ignore on read.'),
         Field('P', 'fileName', default=0, help='Used in memory only. Write zero. Ignore on read.'),
@@ -200,7 +211,7 @@ WaveHeader5 = Structure(
         Field('h', 'dLock', default=0, help='Reserved. Write zero. Ignore on read.'),
         Field('c', 'whpad1', default=0, help='Reserved. Write zero. Ignore on read.', count=6),
         Field('h', 'whVersion', default=1, help='Write 1. Ignore on read.'),
-        Field('c', 'bname', help='Name of wave plus trailing null.', count=MAX_WAVE_NAME5+1),
+        Field('%ds' % (MAX_WAVE_NAME5+1), 'bname', help='Name of wave plus trailing null.'),
         Field('l', 'whpad2', default=0, help='Reserved. Write zero. Ignore on read.'),
         Field('P', 'dFolder', default=0, help='Used in memory only. Write zero. Ignore on read.'),
         # Dimensioning info. [0] == rows, [1] == cols etc
@@ -268,6 +279,11 @@ PackedFileRecordType = {
 # invert
 PackedFileRecordId = dict((v,k) for k, v in PackedFileRecordType.items())
 
+# record types pack_scan_tree() cares about
+_REC_WAVE          = PackedFileRecordId['Wave']
+_REC_FOLDER_START  = PackedFileRecordId['DataFolderStart']
+_REC_FOLDER_END    = PackedFileRecordId['DataFolderEnd']
+
 def need_to_reorder_bytes(version):
     '''
     If the low order byte of the version field of the BinHeader
@@ -288,10 +304,27 @@ def byte_order(needToReorderBytes):
         return '<'  # little-endian
     return '>'  # big-endian    
 
+# size of the largest BinHeader/WaveHeader combination
+_max_header_size = max(BinHeader1.size + WaveHeader2.size,
+                       BinHeader2.size + WaveHeader2.size,
+                       BinHeader3.size + WaveHeader2.size,
+                       BinHeader5.size + WaveHeader5.size)
+
+# (version, byte_order) -> (bin, wave, checkSumSize), see below
+_reading_structs = {}
+
 def wave_get_reading_structs(version, byte_order):
     '''
     Returns the objects needed to read specified file version.
+    The structures are set up once per version and byte order,
+    and are private copies (i.e. reading doesn't change the byte
+    order of the module-wide BinHeader*/WaveHeader* structures).
     '''
+    try:
+        return _reading_structs[(version, byte_order)]
+    except KeyError:
+        pass
+
     if version == 1:
         bin = BinHeader1
         wave = WaveHeader2
@@ -307,11 +340,12 @@ def wave_get_reading_structs(version, byte_order):
     else:
         raise FormatError ('This does not appear to be a valid Igor binary wave file.'
                            ' The version field = %d.' % version)
+    bin = Structure (name=bin.name, fields=bin.fields, byte_order=byte_order)
+    wave = Structure (name=wave.name, fields=wave.fields, byte_order=byte_order)
     checkSumSize = bin.size + wave.size
     if version == 5:
         checkSumSize -= 4  # Version 5 checksum does not include the wData field.
-    bin.set_byte_order(byte_order)
-    wave.set_byte_order(byte_order)
+    _reading_structs[(version, byte_order)] = (bin, wave, checkSumSize)
     return (bin, wave, checkSumSize)
 
 
@@ -320,20 +354,14 @@ def checksum(buffer, byte_order, oldcksum, numbytes):
     Returns the IgorPro checksum over *buffer*, simlating an 32-bit integer
     rollover squeezed into a 16-bit signed short.
     '''
-    x = numpy.ndarray(
-        (numbytes/2,), # 2 bytes to a short -- ignore trailing odd byte
-        dtype=numpy.dtype(byte_order+'h'),
-        buffer=buffer)
-    oldcksum += x.sum()
-    if oldcksum > 2**31:  # fake the C implementation's int rollover
-        oldcksum %= 2**32
-        if oldcksum > 2**31:
-            oldcksum -= 2**31
-    assert (oldcksum >= -2**31 and oldcksum < 2**31)
-    chk = oldcksum & 0xffff
-    if chk >= 2**15:
-        chk -= 2**16
-    return chk
+    x = numpy.frombuffer(buffer,
+                         dtype=numpy.dtype(byte_order+'h'),
+                         count=numbytes//2) # 2 bytes to a short -- ignore trailing odd byte
+    # Only the lower 16 bits of the C int sum survive, and those don't
+    # care about the 32-bit rollover -- so we just sum up in 64 bits
+    # and map the lower 16 bits onto a signed short.
+    s = int(x.sum(dtype=numpy.int64)) + oldcksum
+    return ((s + 0x8000) & 0xffff) - 0x8000
 
 
 def load(filename):
@@ -350,6 +378,23 @@ def load(filename):
     return wave_read(filename)
 
 
+# Most note values are plain numbers, which we can convert without
+# going through literal_eval()'s compile step. The patterns only accept
+# what Python itself would take as an int or float literal.
+_note_int   = re.compile (r"[-+]?(0|[1-9][0-9]*)$")
+_note_float = re.compile (r"[-+]?([0-9]+\.[0-9]*|\.[0-9]+|[0-9]+(?=[eE]))([eE][-+]?[0-9]+)?$")
+
+def _note_eval (s):
+    '''
+    Same as literal_eval(s), only faster for plain numbers.
+    '''
+    if _note_int.match(s):
+        return int(s)
+    if _note_float.match(s):
+        return float(s)
+    return literal_eval(s)
+
+
 def wave_note_parse_simple (notestr, strict_blocks=False, sep=None):
     '''
     Parses the "notes" string of a wave for useful information.
@@ -379,17 +424,16 @@ def wave_note_parse_simple (notestr, strict_blocks=False, sep=None):
     nmap = { "strays": [] }
     cur_map = nmap
     cur_map_name = ""
-    sec = re.compile ("\[[^].]\]")
 
     if sep is None:
         #
         # Automatic separator: use both \r and \n
         #
-        new_note = notestr.replace('\r', '\n')
-        newnote = new_note
-        sep = '\n'
+        lines = notestr.splitlines()
+    else:
+        lines = notestr.split(sep)
 
-    for n in new_note.split(sep):
+    for n in lines:
         line = n.strip()
 
         # What to do on empty lines?
@@ -429,22 +473,19 @@ def wave_note_parse_simple (notestr, strict_blocks=False, sep=None):
         val_str = nv[1].strip()
 
         # trying to evaluate 'val' parameter to a decent python object;
-        # if not possible, assume object is a string, and evaluate object element-wise;
-        # if even that fails, return the plain string;
+        # if not possible, assume object is a string, and evaluate object element-wise
+        # (only literals are evaluated, notes are not supposed to run code).
         try:
-            val_py = eval(val_str)
-        except:
-            try:
-                val_list = []
-                for s in val_str.split():
-                    try:
-                        val_py = eval(s)
-                    except:
-                        val_py = str(s)
-                    val_list.append(val_py)
-                val_py = val_list
-            except:
-                val_py = val_str
+            val_py = _note_eval(val_str)
+        except (ValueError, SyntaxError, TypeError):
+            val_list = []
+            for s in val_str.split():
+                try:
+                    val_py = _note_eval(s)
+                except (ValueError, SyntaxError, TypeError):
+                    val_py = str(s)
+                val_list.append(val_py)
+            val_py = val_list
         cur_map[key_str] = val_py
 
     # save the last section, if not already saved
@@ -455,6 +496,10 @@ def wave_note_parse_simple (notestr, strict_blocks=False, sep=None):
 
 wave_note_parse = wave_note_parse_simple
 
+# info keys that wave_note_generate() doesn't write as root entries / blocks
+_note_root_ignore = frozenset(("debug", "strays", "axes", "name", "tmp"))
+_note_block_ignore = frozenset(("debug", "strays", "axes", "name"))
+
 def wave_note_generate (infomap, block_prefix='', sep='\r'):
     '''
     Wries the infomap into a string representation that can be
@@ -471,13 +516,12 @@ def wave_note_generate (infomap, block_prefix='', sep='\r'):
     our own format...)
     '''
     sep = '\n'
-    notestr = ''
-
+    parts = []  # joined in one go at the end
 
     ## first, write root-block entries
     for (k,v) in infomap.items():
         # there are some sections to be ignored -- they're for internal use only
-        if k in ["debug", "strays", "axes", "name", "tmp" ]:
+        if k in _note_root_ignore:
             continue
         
         # if item is a dictionary, ignore
@@ -489,14 +533,14 @@ def wave_note_generate (infomap, block_prefix='', sep='\r'):
             val = str(v)
         else:
             val = v
-        notestr += "%s = %s%s" % (k, val, sep)
+        parts.append ("%s = %s%s" % (k, val, sep))
 
-    notestr += sep
+    parts.append (sep)
 
     ## second, write the regular blocks section
     for (k,v) in infomap.items():
         # there are some sections to be ignored -- they're for internal use only
-        if k in ["debug", "strays", "axes", "name" ]:
+        if k in _note_block_ignore:
             continue
 
         # if it's a dictionary, add a [subsection]
@@ -505,16 +549,39 @@ def wave_note_generate (infomap, block_prefix='', sep='\r'):
                 blk = block_prefix+k
             else:
                 blk = k
-            notestr += "[%s]%s" % (blk, sep)
-            notestr += wave_note_generate (v)
-    notestr += sep
+            parts.append ("[%s]%s" % (blk, sep))
+            parts.append (wave_note_generate (v))
+    parts.append (sep)
 
     ## second, add the stray-lines section
     if "strays" in infomap:
         for l in infomap["strays"]:
-            notestr += "%s%s" % (l, sep)
+            parts.append ("%s%s" % (l, sep))
             
-    return notestr
+    return ''.join(parts)
+
+def _readinto (f, buf):
+    '''
+    Same as f.readinto(buf), also for streams that don't have
+    a readinto() method (e.g. mmap objects). Keeps reading until
+    *buf* is full or the end of the stream is reached (raw, unbuffered
+    files may return less than requested), and returns the number
+    of bytes read.
+    '''
+    buf = memoryview(buf).cast('B')
+    total = 0
+    while total < len(buf):
+        if hasattr(f, 'readinto'):
+            n = f.readinto (buf[total:]) or 0
+        else:
+            chunk = f.read (len(buf)-total)
+            n = len(chunk)
+            buf[total:total+n] = chunk
+        if n == 0:
+            break
+        total += n
+    return total
+
 
 def wave_read_header(filename):
     '''
@@ -526,20 +593,39 @@ def wave_read_header(filename):
     if hasattr(filename, 'read'):
         f = filename  # filename is actually a stream object
     else:
-        f = open(filename, 'rb')
+        # unbuffered: the headers are read in one go, right into our own buffer
+        f = open(filename, 'rb', buffering=0)
     try:
 
-        b = buffer(f.read(BinHeaderCommon.size))
-        version = BinHeaderCommon.unpack_dict_from(b)['version']
-        needToReorderBytes = need_to_reorder_bytes(version)
-        byteOrder = byte_order(needToReorderBytes)
-    
-        if needToReorderBytes:
-            BinHeaderCommon.set_byte_order(byteOrder)
-            version = BinHeaderCommon.unpack_dict_from(b)['version']
+        # Read as much as the largest set of headers needs in one go,
+        # and give back to the stream what turns out to be wave data.
+        # Streams we can't seek back on (pipes, sockets) are read
+        # exactly instead: the version first, then the rest of the headers.
+        if hasattr(f, 'seekable'):
+            seekable = f.seekable()
+        else:
+            seekable = hasattr(f, 'seek')  # e.g. mmap objects
+        hdr = bytearray(_max_header_size)
+        b = memoryview(hdr)
+        nread = _readinto (f, b if seekable else b[:2])
+
+        # The version (1..5) lives in the low byte of the first short,
+        # so a zero first byte means a big-endian file (this is what
+        # need_to_reorder_bytes() checks, without unpacking twice).
+        if hdr[0] == 0:
+            byteOrder, version = '>', hdr[1]
+        else:
+            byteOrder, version = '<', hdr[0] | (hdr[1] << 8)
         bin_struct, wave_struct, checkSumSize = wave_get_reading_structs(version, byteOrder)
 
-        b = buffer(b + f.read(bin_struct.size + wave_struct.size - BinHeaderCommon.size))
+        hsize = bin_struct.size + wave_struct.size
+        if not seekable and nread == 2:
+            nread += _readinto (f, b[2:hsize])
+        if nread < hsize:
+            raise FormatError ('%s: file too short for an Igor binary wave header.' % filename)
+        if nread > hsize:
+            f.seek (hsize-nread, 1)
+        b = b[:hsize]
         c = checksum(b, byteOrder, 0, checkSumSize)
         if c != 0:
             raise VersionError('%s: error in checksum - should be 0, is %d.  '
@@ -570,10 +656,15 @@ def wave_read_header(filename):
             bin_info['tail_size'] = 4
             bin_info['wave_data_size'] = bin_info['wfmSize'] - (wave_struct.size - bin_info['tail_size'])
 
-        bin_info['tail_data'] = numpy.array(b[-bin_info['tail_size']:])
+        # (copied, so that it doesn't keep the header buffer alive)
+        ts = bin_info['tail_size']
+        bin_info['tail_data'] = numpy.frombuffer(b, dtype=numpy.uint8,
+                                                 offset=len(b)-ts, count=ts).copy()
         bin_info['byte_order'] = byteOrder
 
-        wave_info['name'] = ''.join(wave_info.setdefault('bname', '(bastard wave)'))
+        # bname comes as one null-padded byte string
+        wave_info['bname'] = wave_info['bname'].split(b'\0', 1)[0].decode('latin-1')
+        wave_info['name'] = wave_info['bname'] or '(bastard wave)'
         
         return wave_info, bin_info
 
@@ -588,11 +679,7 @@ def wave_read_data (f, wave_info, bin_info):
     Reads main wave data
     '''
         
-    # dtype() wrapping to avoid numpy.generic and
-    # getset_descriptor issues with the builtin Numpy types
-    # (e.g. int32).  It has no effect on our local complex
-    # integers.
-    t = numpy.dtype(TYPE_TABLE[wave_info['type']])
+    t = TYPE_TABLE[wave_info['type']]
     assert bin_info['wave_data_size'] == wave_info['npnts'] * t.itemsize, \
         ('%d, %d, %d, %s' % (bin_info['wave_data_size'], wave_info['npnts'], t.itemsize, t))
 
@@ -601,12 +688,37 @@ def wave_read_data (f, wave_info, bin_info):
     else:
         shape = (wave_info['npnts'],)
         
-    data_b = buffer(buffer(bin_info['tail_data']) + 
-                    f.read(bin_info['wave_data_size']-bin_info['tail_size']))
+    # The wave data goes straight into the (writable) memory
+    # backing the final array, no intermediate bytes objects.
+    size = bin_info['wave_data_size']
+    raw = numpy.empty (size, dtype=numpy.uint8)
+    if isinstance (f, mmap.mmap):
+        # the tail data is just the beginning of the wave data, so
+        # with the file mapped, we can copy the whole block in one go
+        # instead of gluing tail and the rest of the data together.
+        start = f.tell() - bin_info['tail_size']
+        nread = max(0, min(size, len(f)-start))
+        raw[:nread] = numpy.frombuffer (f, dtype=numpy.uint8, count=nread, offset=start)
+        f.seek (start+nread)
+    else:
+        # read the rest of the data right behind the tail data
+        ts = bin_info['tail_size']
+        raw[:ts] = bin_info['tail_data']
+        nread = ts + _readinto (f, memoryview(raw)[ts:])
+    if nread != size:
+        raise FormatError ('Wave data truncated: expected %d bytes, got %d.'
+                           % (size, nread))
     data = Wave (shape=shape,
                  dtype=t.newbyteorder(bin_info['byte_order']),
-                 buffer=data_b,
-                 order='F').newbyteorder('=')
+                 buffer=raw,
+                 order='F')
+
+    # Data from a foreign-endian file is swapped into native order
+    # once, here. (Only relabeling the dtype as native would reinterpret
+    # the bytes, and leaving it foreign would have every later operation
+    # on the wave pay for the swapping.)
+    if bin_info['byte_order'] != byte_order(False):
+        data = data.byteswap(True).view(t.newbyteorder('='))
     return data
 
 
@@ -624,10 +736,10 @@ def wave_read_info(f, wave_info, bin_info):
         # Post-data info:
         #   * 16 bytes of padding
         #   * Optional wave note data
-        pad_b = buffer(f.read(16))  # skip the padding
+        pad_b = f.read(16)  # skip the padding
         log.debug("pad: %s, size: %d" % (pad_b, len(pad_b)))
         #assert max(pad_b) == 0, pad_b
-        bin_info['note'] = str(f.read(bin_info['noteSize'])).strip()
+        bin_info['note'] = f.read(bin_info['noteSize']).decode('latin-1').strip()
 
     elif version == 3:
         # Post-data info:
@@ -641,10 +753,10 @@ def wave_read_info(f, wave_info, bin_info):
         dependency formula is "sin(x)". The formula is stored with
         no trailing null byte.
         """
-        pad_b = buffer(f.read(16))  # skip the padding
+        pad_b = f.read(16)  # skip the padding
         assert max(pad_b) == 0, pad_b
-        bin_info['note'] = str(f.read(bin_info['noteSize'])).strip()
-        bin_info['formula'] = str(f.read(bin_info['formulaSize'])).strip()
+        bin_info['note'] = f.read(bin_info['noteSize']).decode('latin-1').strip()
+        bin_info['formula'] = f.read(bin_info['formulaSize']).decode('latin-1').strip()
     elif version == 5:
         # Post-data info:
         #   * Optional wave dependency formula
@@ -676,15 +788,15 @@ def wave_read_info(f, wave_info, bin_info):
               bytes. Longer units can be stored using the optional
               extended dimension units section of the file.
               """
-        bin_info['formula'] = str(f.read(bin_info['formulaSize'])).strip()
-        bin_info['note'] = str(f.read(bin_info['noteSize'])).strip()
-        bin_info['dataEUnits'] = str(f.read(bin_info['dataEUnitsSize'])).strip()
+        bin_info['formula'] = f.read(bin_info['formulaSize']).decode('latin-1').strip()
+        bin_info['note'] = f.read(bin_info['noteSize']).decode('latin-1').strip()
+        bin_info['dataEUnits'] = f.read(bin_info['dataEUnitsSize']).decode('latin-1').strip()
         bin_info['dimEUnits'] = [
-            str(f.read(size)).strip() for size in bin_info['dimEUnitsSize']]
+            f.read(size).decode('latin-1').strip() for size in bin_info['dimEUnitsSize']]
         bin_info['dimLabels'] = []
         for size in bin_info['dimLabelsSize']:
-            labels = str(f.read(size)).split(chr(0)) # split null-delimited strings
-            bin_info['dimLabels'].append([L for L in labels if len(L) > 0])
+            bin_info['dimLabels'].append([L.decode('latin-1')   # null-delimited strings
+                                          for L in f.read(size).split(b'\0') if L])
         if wave_info['type'] == 0:  # text wave
             bin_info['sIndices'] = f.read(bin_info['sIndicesSize'])
 
@@ -710,8 +822,19 @@ def wave_read (filename, note_parse=True, note_text=None):
         f = filename  # filename is actually a stream object
         filepath = filename.name
     else:
-        f = open(filename, 'rb')
+        # Files given by name are memory-mapped; the parsing below
+        # then reads from the mapping, the mmap object has the same
+        # read()/seek()/tell() interface as a file stream.
+        # (Empty files can't be mapped -- those are read the usual
+        # way and fail in the header parser.)
+        fobj = open(filename, 'rb', buffering=0)
         filepath = filename
+        try:
+            f = mmap.mmap (fobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            f = fobj
+        else:
+            fobj.close()
     try:
         
         wave_info, bin_info = wave_read_header (f)
@@ -734,7 +857,7 @@ def wave_read (filename, note_parse=True, note_text=None):
         #data.info.update (wave_info)
 
         # set some useful wave info
-        data.info['name'] = ''.join(wave_info.setdefault('bname', '(bastard wave)'))
+        data.info['name'] = wave_info['name']
         
         if note_parse in ('no', None, False):
             pass
@@ -749,7 +872,7 @@ def wave_read (filename, note_parse=True, note_text=None):
         elif isinstance (note_text, bytearray):
             del note_text[0:-1]
 
-            note_text.extend(bin_info['note'].replace('\r', '\n'))
+            note_text.extend(bin_info['note'].replace('\r', '\n').encode('latin-1'))
 
         # have all the data, now set explicit scaling information
         if 'sfA' in wave_info and 'sfB' in wave_info:
@@ -796,16 +919,16 @@ def wave_init_header5():
         'modDate': 0,           # DateTime of last modification.
         'npnts': 0,             # Total number of points (multiply dimensions up to first zero).
         'type': 0,              # See types (e.g. NT_FP64) above. Zero for text waves.
-        'bname': ['\0' for i in range(0, MAX_WAVE_NAME5+1)],       # Name of wave plus trailing null.
+        'bname': b'',           # Name of wave plus trailing null (padded when packing).
 
         # Dimensioning info. [0] == rows, [1] == cols etc
-        'nDim': [0 for i in range(0, MAXDIMS)],   # Number of items in a dimension -- 0 means no data.
-        'sfA':  [0 for i in range(0, MAXDIMS)],   # Index value for element e of dimension d = sfA[d]*e + sfB[d].
-        'sfB':  [0 for i in range(0, MAXDIMS)],   # Index value for element e of dimension d = sfA[d]*e + sfB[d].
+        'nDim': [0]*MAXDIMS,                    # Number of items in a dimension -- 0 means no data.
+        'sfA':  [0]*MAXDIMS,                    # Index value for element e of dimension d = sfA[d]*e + sfB[d].
+        'sfB':  [0]*MAXDIMS,                    # Index value for element e of dimension d = sfA[d]*e + sfB[d].
 
         # SI units
-        'dataUnits': ['\0' for i in range(0, MAX_UNIT_CHARS+1)],  # Natural data units go here
-        'dimUnits': ['\0' for i in range(0, (MAX_UNIT_CHARS+1) * MAXDIMS)],
+        'dataUnits': [b'\0']*(MAX_UNIT_CHARS+1),                # Natural data units go here
+        'dimUnits': [b'\0']*((MAX_UNIT_CHARS+1) * MAXDIMS),
                     # Natural dimension units go here - null if none.
         'fsValid':  0,          # TRUE if full scale values have meaning.
         'topFullScale': 0,      # The max and max full scale value for wave.
@@ -813,13 +936,13 @@ def wave_init_header5():
         'wData': 0,             # The start of the array of data.  Must be 64 bit aligned.
 
         # reserved/unused/Igor only flags
-        'dLock': 0, 'whpad1': ['\0' for i in range(0,6)], 'whVersion': 1, 'whpad2': 0, 'dFolder': 0,
+        'dLock': 0, 'whpad1': [b'\0']*6, 'whVersion': 1, 'whpad2': 0, 'dFolder': 0,
 
         'whpad3': 0,     'dataEUnits': 0,
-        'dimEUnits': [0 for i in range(0, MAXDIMS)], 'dimLabels': [0 for i in range(0, MAXDIMS)],
-        'waveNoteH': 0, 'whUnused': [0 for i in range(0, 16)],
+        'dimEUnits': [0]*MAXDIMS, 'dimLabels': [0]*MAXDIMS,
+        'waveNoteH': 0, 'whUnused': [0]*16,
 
-        'aModified': 0, 'wModified': 0, 'swModified': 0, 'useBits': '0',  'kindBits': '0', 'formula': 0,
+        'aModified': 0, 'wModified': 0, 'swModified': 0, 'useBits': b'\0', 'kindBits': b'\0', 'formula': 0,
         'depID': 0,     'whpad4': 0,    'srcFldr': 0,    'fileName': 0, 'sIndices': 0,
         }
 
@@ -872,7 +995,9 @@ def wave_write (wav, filename, autoname=True, autodir=True, note=None):
         bhead["version"] = 5
         whead["whVersion"] = 1
 
-        wave = wav.newbyteorder('=')
+        # data goes to disk in native byte order; only foreign-endian
+        # waves need converting (newbyteorder() would just relabel them).
+        wave = wav if wav.dtype.isnative else wav.astype(wav.dtype.newbyteorder('='))
 
         # treat the dimensions first
         if len(wave.shape) > MAXDIMS:
@@ -893,25 +1018,21 @@ def wave_write (wav, filename, autoname=True, autodir=True, note=None):
             if  dot_pos  > 0:
                 wname = wname[:dot_pos]
             #log.debug ("renaming wave to '%s'" % wname)
-        whead['bname'] = wname[:MAX_WAVE_NAME5]+((MAX_WAVE_NAME5+1-len(wname))*'\0')
-
-        # Find the data type by going through the TYPE_TABLE dict.
-        # Indexing the reverse dictionary just won't do it... (need to understand why later... :-) )
-        wtype    = None
-        wtype_id = 0
-        rev_types = dict((v,k) for k,v in TYPE_TABLE.items())
-        for k,v in TYPE_TABLE.items():
-            if wave.dtype == v:
-                wtype = v
-                wtype_id = k
-                #print wtype, wtype_id
+        whead['bname'] = wname[:MAX_WAVE_NAME5].encode('latin-1', 'replace') # null-padded by struct
+
+        # Find the data type (TYPE_TABLE holds dtype objects, which
+        # hash and compare by value, so the reverse table just works).
+        wtype_id = TYPE_IDS.get(wave.dtype, 0)
+        wtype    = TYPE_TABLE[wtype_id]
         whead['type'] = wtype_id
-        if wtype == None:
+        if wtype is None:
             log.warn ("Data type is remains 'None', which probably means that actual type '%s' was not recognized as any of: %s" % (str(wave.dtype), [str(v) for k,v in TYPE_TABLE.items()]))
 
         # set the wave note
         note_text = note if note is not None \
                     else wave_note_generate (wave.info) # ...or from wave.info
+        if not isinstance (note_text, bytes):
+            note_text = note_text.encode ('latin-1', 'replace')
         bhead['noteSize'] = len(note_text)
 
         # calculate sizes and checksums etc
@@ -922,18 +1043,20 @@ def wave_write (wav, filename, autoname=True, autodir=True, note=None):
 
         # Checksum is the (negative of the) sum over BinHeader5 and WaveHeader5 structures,
         # not including wData. Thus, the sum over the first 384 bytes needs to be zero.
-        chk = checksum (buffer(BinHeader5.pack_dict(bhead)+WaveHeader5.pack_dict(whead)),
+        chk = checksum (BinHeader5.pack_dict(bhead)+WaveHeader5.pack_dict(whead),
                         byte_order(0), 0, BinHeader5.size+WaveHeader5.size - 4)
         bhead['checksum'] = -chk
     
         f.write (BinHeader5.pack_dict(bhead))
-        f.write (buffer(WaveHeader5.pack_dict(whead), 0,
-                        WaveHeader5.size - 4)) # don't write the wData field
+        f.write (memoryview(WaveHeader5.pack_dict(whead))[:WaveHeader5.size - 4]) # don't write the wData field
         # Need to write data to file, apparently starting with higher
         # dimensions first. Take care to access a "native" byte order
         # version of the data, otherwise tofile() will do nasty things.
-        transpose(wave).tofile(f)
-        f.write (buffer(note_text))
+        # The transposed view is made contiguous first (a no-op for
+        # Fortran-ordered waves, e.g. those we've read from IBW files),
+        # so that tofile() can dump it in one go.
+        numpy.ascontiguousarray(transpose(wave)).tofile(f)
+        f.write (note_text)
 
     finally:
         f.close()
@@ -997,7 +1120,7 @@ def wave_find (filename='', pack_tree={}):
     else:
         # if no igor path is specified, then check if the file itself is a wave
         winfo, wbin = wave_read_header (real_filename)
-        tree['wname'] = ''.join(winfo.setdefault('bname', os.path.basename(real_filename)))
+        tree['wname'] = winfo['bname'] or os.path.basename(real_filename)
         tree['wpath'] = real_filename
         tree['offset'] = 0
 
@@ -1008,6 +1131,11 @@ def wave_save(filename):
     raise NotImplementedError
 
 
+# Read buffer size for scanning packed files: large enough to serve runs
+# of small records (history, procedures, small waves...) from memory,
+# small enough not to waste much when the next record follows a big wave.
+_pack_scan_buffer = 256*1024
+
 def pack_scan_tree (filename, dbg_folder_prefix=''):
     '''
     Returns the tree structure of an Igor packed file.
@@ -1019,60 +1147,71 @@ def pack_scan_tree (filename, dbg_folder_prefix=''):
         f = filename  # filename is actually a stream object
     else:
         log.debug ("Reading file %s" % filename)
-        f = open(filename, 'rb')
+        f = open(filename, 'rb', buffering=_pack_scan_buffer)
     try:
 
-        num_waves = 0
+        # Folders are scanned iteratively: *tree* is the folder currently
+        # being filled, and the enclosing folders wait on *stack* as
+        # (tree, prefix, num_waves) tuples.
+        tree, prefix, num_waves = pack_tree, dbg_folder_prefix, 0
+        stack = []
+
+        # record headers are all read into the same buffer
+        b = bytearray(PackedFileRecordHeader.size)
+        mv = memoryview(b)
         
         while True:
-            b = buffer(f.read(PackedFileRecordHeader.size))
-
-            if (len(b) < PackedFileRecordHeader.size):
+            if _readinto (f, mv) < PackedFileRecordHeader.size:
                 break
 
-            rec = PackedFileRecordHeader.unpack_dict_from(b)
-            rec_type_id = rec['recordType'] & 0x7fff
+            # plain tuple unpacking, no need for a dict per record
+            rec_type, rec_version, rec_size = PackedFileRecordHeader.unpack_from(b)
+            rec_type_id = rec_type & 0x7fff
 
             if rec_type_id >= 11:
-                log.debug ('Skipping internal Igor block %d (%d bytes)' % 
-                           (rec_type_id, rec['numDataBytes']))
-                f.seek (rec['numDataBytes'], 1)
-
-            elif PackedFileRecordType[rec_type_id] == 'DataFolderStart':
-                folder_name = str(f.read(rec["numDataBytes"])).split("\0")[0]
-                log.debug ("Folder %s/%s (%d bytes)" %
-                           (dbg_folder_prefix, folder_name, rec['numDataBytes']))
-                # recursively scan the folder
-                pack_tree[folder_name] = { 'type': 'folder',
-                                           'name': folder_name,
-                                           'sub': pack_scan_tree (f, "%s/%s" % 
-                                                                  (dbg_folder_prefix, folder_name)) }
-
-            elif PackedFileRecordType[rec_type_id] == 'DataFolderEnd':
-                f.seek (rec['numDataBytes'], 1)
-                break # exit recursion step
-
-            elif PackedFileRecordType[rec_type_id] == 'Wave':
+                log.debug ('Skipping internal Igor block %d (%d bytes)',
+                           rec_type_id, rec_size)
+                f.seek (rec_size, 1)
+
+            elif rec_type_id == _REC_FOLDER_START:
+                folder_name = f.read(rec_size).split(b"\0")[0].decode('latin-1')
+                log.debug ("Folder %s/%s (%d bytes)",
+                           prefix, folder_name, rec_size)
+                # descend into the folder
+                sub = {}
+                tree[folder_name] = { 'type': 'folder',
+                                      'name': folder_name,
+                                      'sub': sub }
+                stack.append ((tree, prefix, num_waves))
+                tree, prefix, num_waves = sub, "%s/%s" % (prefix, folder_name), 0
+
+            elif rec_type_id == _REC_FOLDER_END:
+                f.seek (rec_size, 1)
+                if len(stack) == 0:
+                    break # end of the folder we started in
+                tree, prefix, num_waves = stack.pop()
+
+            elif rec_type_id == _REC_WAVE:
                 wpos1 = f.tell()
                 winfo, wbin = wave_read_header (f)
                 wpos2 = f.tell()
-                wname = ''.join(winfo.setdefault('bname', 'wave%d' % num_waves))
-                pack_tree[wname] = {
+                wname = winfo['bname'] or 'wave%d' % num_waves
+                tree[wname] = {
                     'type': 'wave',
                     'offset': wpos1, 
-                    'size': rec['numDataBytes'],
+                    'size': rec_size,
                     'name': wname
                     }
                 num_waves = num_waves + 1
-                log.debug ("Wave %s/%s (%d bytes, offset %d)" %
-                           (dbg_folder_prefix, wname, rec['numDataBytes'], wpos1))
-                f.seek ((rec['numDataBytes'] - (wpos2-wpos1)), 1)  # skip the res of the wave data
+                log.debug ("Wave %s/%s (%d bytes, offset %d)",
+                           prefix, wname, rec_size, wpos1)
+                f.seek ((rec_size - (wpos2-wpos1)), 1)  # skip the res of the wave data
 
             else:
                 # default behavior is to ignore all other fields
-                log.debug ("Skipping block '%s' (%d bytes)" % 
-                           (PackedFileRecordType[rec_type_id], rec['numDataBytes']))
-                f.seek (rec['numDataBytes'], 1)
+                log.debug ("Skipping block '%s' (%d bytes)",
+                           PackedFileRecordType[rec_type_id], rec_size)
+                f.seek (rec_size, 1)
         
     finally:
         if not hasattr(filename, 'read'):
@@ -1081,6 +1220,44 @@ def pack_scan_tree (filename, dbg_folder_prefix=''):
     return pack_tree
 
 
+def _copy_range (src, dst, offset, size, chunk=1<<20):
+    '''
+    Copies *size* bytes, starting at *offset*, from the file *src* to
+    the file *dst* (at its current position). Uses os.sendfile() where
+    available (the data doesn't pass through Python at all), otherwise
+    copies in chunks of *chunk* bytes, so that large waves aren't held
+    in memory as a whole.
+    Raises FormatError if *src* ends before *size* bytes were copied.
+    '''
+    wanted = size
+    done = False
+    if hasattr(os, 'sendfile'):
+        try:
+            dst.flush()
+            while size > 0:
+                n = os.sendfile (dst.fileno(), src.fileno(), offset, size)
+                if n == 0:
+                    break  # end of source file
+                offset += n
+                size -= n
+            done = True
+        except (OSError, ValueError):
+            pass  # not supported for these files, continue the hard way
+
+    if not done:
+        src.seek (offset)
+        while size > 0:
+            buf = src.read (min(chunk, size))
+            if len(buf) == 0:
+                break
+            dst.write (buf)
+            size -= len(buf)
+
+    if size > 0:
+        raise FormatError ('Packed file truncated: expected %d bytes, got %d.'
+                           % (wanted, wanted-size))
+
+
 def pack_unpack (filename, basedir=".", igordir="", packtree=None):
     '''
     Extracts an Igor packed file, specified by 'filename', to the location
@@ -1091,6 +1268,7 @@ def pack_unpack (filename, basedir=".", igordir="", packtree=None):
         packtree = pack_scan_tree (filename)
 
     src = open (filename, "rb")
+    have_basedir = False
 
     for key in packtree:
         branch = packtree[key]
@@ -1101,29 +1279,31 @@ def pack_unpack (filename, basedir=".", igordir="", packtree=None):
             pack_unpack (filename, basedir=path_real, igordir=path_igor, packtree=branch['sub'])
         elif branch['type'] == 'wave':
             print("Unpacking IBW file %s \t(from %s)" % (path_real, path_igor))
-            if not os.path.isdir (basedir):
-                os.makedirs (basedir)
+            if not have_basedir:   # checked once per folder, not per wave
+                if not os.path.isdir (basedir):
+                    os.makedirs (basedir)
+                have_basedir = True
             dst = open(path_real+".ibw", "wb")
-            src.seek (branch['offset'])
-            dst.write (src.read(branch['size']))
-            dst.close()
+            try:
+                _copy_range (src, dst, branch['offset'], branch['size'])
+            finally:
+                dst.close()
 
     log.debug ("Unpacking finished.")
     src.close()
 
 
-def pack_make_uxp (path, out=None, _prefix=''):
+def pack_make_uxp (path, out=None, _prefix='', _lines=None):
     '''
     Creates a rudimentary UXP file to load all components from *path*
     in Igor. Writes the UXP code to stream *out*, if specified,
-    or to stdout otherwise. *_prefix* is an internal parameter used
-    for recursion control.
+    or to stdout otherwise. *_prefix* and *_lines* are internal
+    parameters used for recursion control (the UXP lines are collected
+    in *_lines* and written out in one go at the end).
     '''
     
-    if isinstance(out, str):
-        out = open(out, "w")
-    elif out is None:
-        out = sys.stdout
+    if _lines is None:
+        _lines = []
 
     path_igor = path.replace("/", ":")
     full_path = os.path.join(_prefix, path)
@@ -1131,27 +1311,33 @@ def pack_make_uxp (path, out=None, _prefix=''):
     
     if len(_prefix) == 0:
         # this is the entry point, print some extra igor commands
-        out.write ("// Auto-generated by Paul\r")
-        out.write ("Silent 101\r")
-        out.write ('NewPath home "%s"\r\r' % full_path_igor)
-        out.write ("\r")
+        _lines.append ("// Auto-generated by Paul\r")
+        _lines.append ("Silent 101\r")
+        _lines.append ('NewPath home "%s"\r\r' % full_path_igor)
+        _lines.append ("\r")
     else:
-        out.write ("NewDataFolder/S '%s'\r" % path_igor)
-        out.write ('NewPath home "%s"\r' % full_path_igor)
+        _lines.append ("NewDataFolder/S '%s'\r" % path_igor)
+        _lines.append ('NewPath home "%s"\r' % full_path_igor)
 
     #
     # need to load IBWs before descending into subdirectories -- that's
     # we sort the files and dirs apart early and loop individually over them
     #
     
-    listdir = os.listdir(full_path)
-    file_list = [ f for f in listdir if os.path.isfile(os.path.join(full_path,f)) ]
-    dir_list  = [ f for f in listdir if os.path.isdir (os.path.join(full_path,f)) ]
+    # (scandir() knows the entry types from the listing itself,
+    # no extra stat() per entry)
+    file_list, dir_list = [], []
+    with os.scandir(full_path) as it:
+        for e in it:
+            if e.is_file():
+                file_list.append (e.name)
+            elif e.is_dir():
+                dir_list.append (e.name)
     
     for entry in file_list:
 
         # path relative to main directory
-        fpath = os.path.join (full_path, f)
+        fpath = os.path.join (full_path, entry)
 
         # extenstion
         ext_i = entry.rfind(".")
@@ -1161,24 +1347,30 @@ def pack_make_uxp (path, out=None, _prefix=''):
 
         # extension-dependent treating
         if ext.lower() == ".ibw":
-            out.write ('LoadWave /P=home "%s"\r' % (entry))
+            _lines.append ('LoadWave /P=home "%s"\r' % (entry))
         elif entry == "variables":
-            out.write ('ReadVariables\r') 
+            _lines.append ('ReadVariables\r') 
 
     for entry in dir_list:
-        pack_make_uxp (entry, out=out, _prefix=full_path)
+        pack_make_uxp (entry, out=out, _prefix=full_path, _lines=_lines)
 
 
 
     if len(_prefix) == 0:
-        out.write ("SetDataFolder root:\r")
+        _lines.append ("SetDataFolder root:\r")
         
         # apparently, at the end Igor looks for variables, history and Procedure
         # in the root experiment directory. Should make one last "NewPath %(full_path)s" here...?
-        out.write ('NewPath home "%s"\r' % full_path_igor)
+        _lines.append ('NewPath home "%s"\r' % full_path_igor)
+
+        if isinstance(out, str):
+            with open(out, "w") as f:
+                f.writelines (_lines)
+        else:
+            (out or sys.stdout).writelines (_lines)
         
     else:
-        out.write ('SetDataFolder ::  // data folder is now: %s\r\r' % (_prefix))
+        _lines.append ('SetDataFolder ::  // data folder is now: %s\r\r' % (_prefix))
 
 
 #
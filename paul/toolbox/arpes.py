@@ -8,7 +8,6 @@ import scipy as sp
 import scipy.interpolate as spi
 import scipy.ndimage.interpolation as spni
 import scipy.ndimage as spimg
-import scipy.linalg as splin
 from pprint import pprint
 import paul.base.wave as wave
 from paul.toolbox.atrix import ncomp
@@ -91,19 +90,36 @@ def e_free(mrel=1.0, ebind=0.0, kpos=0.0, klim=1.0, pts=100, out=None):
             new_klim = [klim, (0.0, 0.0)]
         klim = tuple(new_klim)
 
-    # these are the X and Y axes arrays (1D)
-    axx = sp.linspace(klim[0][0], klim[0][1], pts[0])
-    axy = sp.linspace(klim[1][0], klim[1][1], pts[1])
-    kx = axx[:,np.newaxis]
-    ky = axy[np.newaxis,:]
-
-    #print ("axx: %s, axy: %s\nklim=%s, pts=%s" % (axx, axy, klim, pts))
-
     me   = 9.10938215e-31        # free electron mass [kg]
     hbar = 1.054571628e-34       # in    [kg m^2 / s]
     eV   = 1.60217646e-19        # conversion factor J -> eV [kg m^2 / s^2]
 
-    out = ebind + 1.0/eV * (( (kx**2+ky**2) - (kpos**2))*1.0e20) * (hbar**2.0) / (2.0*mrel*me)
+    # all the scalar factors in one
+    coef = (hbar**2.0) * 1.0e20 / (2.0*mrel*me*eV)
+
+    # these are the X and Y axes arrays (1D)
+    axx = np.linspace(klim[0][0], klim[0][1], pts[0])
+
+    # The dispersion is separable: coef*(kx^2 + ky^2 - kpos^2) + ebind
+    # is the sum of one term in kx (carrying the constants) and one in ky.
+    # Both are evaluated on the 1D axes, and a single broadcasted add
+    # fills the preallocated 2D output.
+    ex = axx*axx
+    ex *= coef
+    ex += ebind - coef*kpos**2
+
+    if pts[1] == 1:
+        # 1D dispersion: the ky-term is a constant, and the
+        # 1D result only needs a (free) 2nd axis
+        ex += coef*klim[1][0]**2
+        out = ex[:,np.newaxis]
+    else:
+        axy = np.linspace(klim[1][0], klim[1][1], pts[1])
+        ey = axy*axy
+        ey *= coef
+        out = np.add (ex[:,np.newaxis], ey[np.newaxis,:], out=np.empty((pts[0], pts[1])))
+
+    #print ("axx: %s, klim=%s, pts=%s" % (axx, klim, pts))
 
     if type(out) is wave.Wave:
         wav = out
@@ -146,18 +162,21 @@ def _hybridize_n2n (wlist, V=0.0, count='auto'):
     if count == 'auto':
         count = len(wlist)
     
-    # Construct V-matrix, if needed.
-    if not hasattr(V, 'shape') or V.shape != (len(wlist), len(wlist)):
-        V = np.matrix([[float(V) for i in wlist] for j in wlist])
+    # Construct V-matrix, if needed (plain ndarray, no np.matrix).
+    N = len(wlist)
+    if not hasattr(V, 'shape') or V.shape != (N, N):
+        V = np.full((N, N), float(V))
+    V = np.asarray(V, dtype=float)
 
     # Symmetrize V-matrix, remove diagonal, average over 
     # elements that are non-zero in both triangles.
-    V2  = (V+V.T - 2*np.diag(np.diag(V)))  /  ((V!=0).astype(float) + 
-                                               (V!=0).astype(float).T + 
-                                               ((V+V.T)==0).astype(float))
+    V2  = V + V.T
+    np.fill_diagonal (V2, 0.0)
+    V2 /= ((V!=0).astype(float) + (V!=0).astype(float).T + ((V+V.T)==0).astype(float))
     
-    # This is what we'll be operating on
-    hlist = list(wlist)
+    # This is what we'll be operating on (float copies, so that
+    # the bands can be updated in-place below)
+    hlist = [ w.astype(float) for w in wlist ]
     
     '''
     Hybridizing bands more than once brings some normalization problems:
@@ -191,15 +210,26 @@ def _hybridize_n2n (wlist, V=0.0, count='auto'):
     Now, V2 is a traceless, symmetric matrix containing coupling
     factors for the bands in hlist, correctly normalized.
     '''
+    # Every (i,j) step works on the bands as left behind by the previous
+    # step, so the pairs can't be done all at once. But mean and root
+    # are shared by both new bands, and only need to be computed once,
+    # into buffers that are reused for all steps.
+    hmean = np.empty(np.shape(hlist[0]))
+    hroot = np.empty(np.shape(hlist[0]))
     for t in range(count):
         for i in range(len(hlist)):
             for j in range(len(hlist)):
                 if i == j:
                     continue
-                h1 = 0.5*(hlist[i]+hlist[j]) + np.sqrt( (0.5*(hlist[j]-hlist[i]))**2 + V2[i,j]**2 )
-                h2 = 0.5*(hlist[i]+hlist[j]) - np.sqrt( (0.5*(hlist[j]-hlist[i]))**2 + V2[i,j]**2 )
-                hlist[i] = h1
-                hlist[j] = h2
+                np.add      (hlist[i], hlist[j], out=hmean)
+                hmean *= 0.5
+                np.subtract (hlist[j], hlist[i], out=hroot)
+                hroot *= 0.5
+                hroot **= 2
+                hroot += V2[i,j]**2
+                np.sqrt (hroot, out=hroot)
+                np.add      (hmean, hroot, out=hlist[i])
+                np.subtract (hmean, hroot, out=hlist[j])
 
     return hlist
     
@@ -240,12 +270,15 @@ def hybridize (wlist, V=0.0):
       point numbers will _not_ be recognized as zero!
     '''
 
-    # build V-matrix, if necessary
-    if not hasattr(V, 'shape') or V.shape != (len(wlist), len(wlist)):
-        V = np.matrix([[float(V) for i in wlist] for j in wlist])
+    # build V-matrix, if necessary (plain ndarray, no np.matrix)
+    N = len(wlist)
+    if not hasattr(V, 'shape') or V.shape != (N, N):
+        V = np.full((N, N), float(V))
+    V = np.asarray(V, dtype=float)
 
     # symmerize matrix, remove diagonal elements
-    v_sym  = (V+V.T - 2*np.diag(np.diag(V)))
+    v_sym  = V + V.T
+    np.fill_diagonal (v_sym, 0.0)
 
     # elements normalization:
     #   . average over elements that are non-zero in both triangles (norm = 2)
@@ -256,23 +289,38 @@ def hybridize (wlist, V=0.0):
                ((V+V.T)==0).astype(float) )    
     V2     = v_sym  /  v_norm
     
-    # flatten bands and zip them element-wise together
-    ebands = list(zip(*[b.flat for b in wlist]))
+    if N == 2:
+        # Two bands (the most common case): the eigenvalues of the
+        # 2x2 Hamiltonian | e1 v | are  (e1+e2)/2 -/+ sqrt(((e2-e1)/2)^2 + v^2),
+        #                 | v e2 |
+        # which can be evaluated on the whole bands at once.
+        hmean = 0.5*(np.asarray(wlist[0], dtype=float) + wlist[1])
+        hroot = 0.5*(np.asarray(wlist[1], dtype=float) - wlist[0])
+        hroot **= 2
+        hroot += V2[0,1]**2
+        np.sqrt (hroot, out=hroot)
+        _hlist = [ hmean - hroot, hmean + hroot ]
 
-    # This is where all the magic happens ;-)
-    #
-    # At this points, we have a 2D matrix (ebands) containing
-    # all original band diagonals (dimension 0), at all k-values
-    # flattened (dimension 1). The only thing we need to do is add
-    # them to V2 to build a 'perturbed' H-matrix and diagonalize it.
-    # For hybridzed bands, eigenvalues need to be re-sorted to avoid
-    # band crossings.
-    hbands = [ np.sort(np.real(splin.eig (V2 + np.diag(Ek), left=False, right=False)))
-               for Ek in ebands ]
+    else:
+        # This is where all the magic happens ;-)
+        #
+        # The only thing we need to do is add the original bands (at
+        # all k-values, flattened) to the diagonal of V2 to build a
+        # 'perturbed' H-matrix for every k, and diagonalize those.
+        # The bands are written straight into the diagonals of the
+        # (K, N, N) stack. H is real and symmetric, so eigvalsh() does
+        # the whole stack in one go and returns the eigenvalues
+        # already sorted (for hybridzed bands, they need to be sorted to
+        # avoid band crossings).
+        H = np.empty((np.size(wlist[0]), N, N))
+        H[...] = V2
+        for i, b in enumerate(wlist):
+            H[:, i, i] += np.ravel(b)
+        hbands = np.linalg.eigvalsh (H)
+        _hlist = [ np.reshape(_h, wlist[0].shape) for _h in  hbands.T ]
 
     # Done, now we basically only reformat the output bands to
     # match the data type and vector layout of the input data.
-    _hlist = [ np.reshape(_h, wlist[0].shape) for _h in  np.array(hbands).T ]
     hlist  = [ np.empty_like(w) for w in wlist ]
     for h, _h in zip(hlist, _hlist):
         h[...] = _h[...]
@@ -325,7 +373,7 @@ def norm_by_fdd (data, axis=0, energy=None, Ef=0.0, kT=None, T=None, dE=None):
 
     if T is not None and dE is not None:
         kboltzmann = 8.617343e-5    # eV/K
-        kT = math.sqrt( (T*3.96*kboltzmann)^2 + dE^2 ) / 3.96
+        kT = math.sqrt( (T*3.96*kboltzmann)**2 + dE**2 ) / 3.96
 
     if kT is None:
         log.error ("Missing parameter: Fermi-Dirac width kT")
@@ -334,16 +382,12 @@ def norm_by_fdd (data, axis=0, energy=None, Ef=0.0, kT=None, T=None, dE=None):
     if energy is None:
         energy = data.dim[0].range
 
-    fdd = 1.0 / ( np.exp((energy-Ef)/kT)+1.0 )
-    while len(fdd.shape) < len(odat.shape):
-        fdd = np.expand_dims(fdd, 1)
-    odat /= fdd
+    # Dividing by the FDD is multiplying by its reciprocal, which
+    # saves the division when building it, too.
+    inv_fdd = np.exp((energy-Ef)/kT)
+    inv_fdd += 1.0
+    odat *= inv_fdd.reshape ((-1,) + (1,)*(odat.ndim-1))
 
-    import paul.loader.igor as igor
-    fdd_w = fdd.view(wave.Wave)
-    fdd_w.dim[0].lim = odat.dim[0].lim
-    igor.wave_write (fdd_w, "foo.ibw")
-    
     odat.info['FDD'] = {'V_min': np.nanmin(data),
                         'V_max': np.nanmax(data),
                         'Ef':    Ef,
@@ -353,7 +397,8 @@ def norm_by_fdd (data, axis=0, energy=None, Ef=0.0, kT=None, T=None, dE=None):
     
 
 def norm_by_noise (data, axis=0, xpos=(None, None), ipos=(None, None),
-                   copy=True, smooth=None, stype='gauss', field=False):
+                   copy=True, smooth=None, stype='gauss', field=False,
+                   allow_float32=False):
     '''
     Normalizes 1D sub-arrays obtained from an N-dimensional ndarray
     along *axis* by the values integrated along
@@ -414,7 +459,7 @@ def norm_by_noise (data, axis=0, xpos=(None, None), ipos=(None, None),
           40 ('ish :-) data points remain.
           None (the default) means no intensity smoothing.
           Down- and up-sampling are performed using 3rd degree
-          splines from (scipy.ndimage.map_coordinates).
+          splines from (scipy.ndimage.zoom).
           Produces polinomial artefacts if intensity distribution
           is very uneven, or data is very noisy.
 
@@ -431,6 +476,12 @@ def norm_by_noise (data, axis=0, xpos=(None, None), ipos=(None, None),
         in its down-, and its up-sampled version will also be
         returned (useful for debugging and data quality
         estimates). See also: PRO TIP below.
+
+      - `allow_float32`: if True, the normalization field and its
+        smoothing are computed, and the result is returned, in single
+        precision, which is plenty for photoemission intensities and
+        halves the memory traffic of everything but reading the input.
+        Only has an effect if *copy* is True.
         
         
         PRO TIP: intensity smoothing can create very strange
@@ -448,11 +499,11 @@ def norm_by_noise (data, axis=0, xpos=(None, None), ipos=(None, None),
     _data = data.swapaxes(0, axis)
 
     # we'll be working on Waves all along -- this is
-    # because we want to retain axis scaling information
-    if copy == True:
-        data2 = _data.copy(wave.Wave)
-    else:
-        data2 = _data.view(wave.Wave)
+    # because we want to retain axis scaling information.
+    # With *copy*, the data is only read until the final normalization,
+    # which writes its results into a new Wave (no extra copy pass).
+    data2 = _data.view(wave.Wave)
+    if copy != True:
         data2.setflags(write=True)
 
     # translate everything to index coordinates,
@@ -466,7 +517,9 @@ def norm_by_noise (data, axis=0, xpos=(None, None), ipos=(None, None),
     # itself will be normalized by the number of composing elements along
     # axis. This way, the normalized area will be, by definition, roughly ~1.0
     # Later we can substract 1.0 from the data to have a well defined zero-level :-)
-    _norm_field   = data2[index[0]:index[1]].sum(0) / (index[1]-index[0])
+    # (mean() divides the sum in-place, no extra (N-1)-dim temporary.)
+    _ftype = np.float32 if (copy == True and allow_float32) else None
+    _norm_field   = data2[index[0]:index[1]].mean(0, dtype=_ftype)
 
     if smooth is not None and stype == 'spline':
         # Smoothing "hack": resample the intensity map twice:
@@ -492,19 +545,16 @@ def norm_by_noise (data, axis=0, xpos=(None, None), ipos=(None, None),
 
                 
         
-        # down-sampling
-        _cmp_coord = np.indices((np.array(_norm_field.shape)/smooth) + np.ones(smooth.shape))
-        for i, s in zip (_cmp_coord, smooth):
-            i *= s
-        _cmp_field = spni.map_coordinates (_norm_field, _cmp_coord,
-                                           order=3, mode='nearest')[np.newaxis]
-            
+        # down-sampling, to about one point every *smooth* points
+        # (zoom() works on the regular grid directly, no need for
+        # full coordinate arrays as with map_coordinates()).
+        _shape = np.array(_norm_field.shape, dtype=float)
+        _cmp_field = spni.zoom (_norm_field, (_shape // smooth + 1) / _shape,
+                                order=3, mode='nearest')
+
         # up-sampling (expand again to original size)
-        _smooth_coord = np.indices(_norm_field.shape).astype('float32')
-        for i, s in zip (_smooth_coord, smooth):
-            i /= s
-        _smooth_field = spni.map_coordinates (_cmp_field[0], _smooth_coord,
-                                              order=3, mode='nearest')
+        _smooth_field = spni.zoom (_cmp_field, _shape / _cmp_field.shape,
+                                   order=3, mode='nearest')
 
         ## Apply correct scaling to _smooth_field and _tmp_field
         ## (this is just for debugging purposes).
@@ -532,7 +582,7 @@ def norm_by_noise (data, axis=0, xpos=(None, None), ipos=(None, None),
         _smooth_field = _norm_field
 
 
-    if not (_smooth_field > 0).all():
+    if not np.min(_smooth_field) > 0:
         err = "Smooth field contains negative values. Are you " \
               "trying to normalize already ground-correted data? " \
               "(You shouldn't.)"
@@ -540,10 +590,16 @@ def norm_by_noise (data, axis=0, xpos=(None, None), ipos=(None, None),
         raise ValueError (err)
         
 
-    while len(data2.shape) > len(_smooth_field.shape):
-        _smooth_field = np.expand_dims(_smooth_field, 0)
-        
-    data2 /= _smooth_field
+    # leading singleton axes, for broadcasting along *axis*
+    # (Wave.reshape() can't add axes, so reshape the plain ndarray)
+    _smooth_field = np.asarray(_smooth_field).reshape ((1,)*(data2.ndim - _smooth_field.ndim) +
+                                                       _smooth_field.shape)
+
+    if copy == True:
+        out = np.empty_like (data2, dtype=_ftype)
+        data2 = np.divide (data2, _smooth_field, out=out)
+    else:
+        data2 /= _smooth_field
     data2 -= 1.0
 
     if field:         # for debugging of code and data... ;-)
@@ -602,7 +658,8 @@ def get_ref2d_profile (refdata, axis=0, steps=None, width=None, ipos=None, xpos=
         steps = ref.shape[1]
     width = math.floor(ref.shape[1] / steps)
 
-    _tmp = ref[ipos[0]:ipos[1]].sum(0)[0:steps*width].view(np.ndarray)
+    # only the first steps*width columns are used, no need to sum up the rest
+    _tmp = ref[ipos[0]:ipos[1], 0:steps*width].sum(0).view(np.ndarray)
     _xin  = np.arange(len(_tmp))
     _xout = np.arange(ref.shape[1])
 
@@ -616,13 +673,121 @@ def get_ref2d_profile (refdata, axis=0, steps=None, width=None, ipos=None, xpos=
     #print _xin[::width]
     #return  _xin[::width], _tmp.reshape((steps,width)).sum(1)/width
 
-    out[:] = spi.UnivariateSpline (_xin[::width],
-                                   _tmp.reshape((steps,width)).sum(1)/width)(_xout)[:]
+    # _tmp is contiguous, so the reshape is only a view, and mean()
+    # does the box-averaging in a single reduction.
+    # The smoothing is done by the box-averaging above (see *steps*),
+    # the spline only interpolates between the averaged points.
+    out[:] = spi.CubicSpline (_xin[::width],
+                              _tmp.reshape((steps,width)).mean(1))(_xout)[:]
 
     return out
     
 
 
+#
+# The reverse coordinates of deg2ky() only depend on the axes, and
+# usually a whole series of data sets is transformed with the very same
+# axes. Keep the most recent ones around, keyed by the axes values, up to
+# _deg2ky_cache_bytes in total. Use deg2ky_clear_cache() to release them.
+#
+_deg2ky_cache = {}
+_deg2ky_cache_bytes = 128*1024*1024
+
+def deg2ky_clear_cache ():
+    '''
+    Releases the reverse coordinates that deg2ky() keeps for reuse.
+    '''
+    _deg2ky_cache.clear()
+
+
+def _deg2ky_klim (E, ideg_d, ideg_t):
+    '''
+    Returns the k-space limits (detector, tilt) of the deg2ky() output
+    grid for the kinetic energies *E* and the angle axes *ideg_d*, *ideg_t*.
+    '''
+    # This is the maximum kinetic energy available *in* *the* *data*
+    # (which is usually larger than the Fermi level :-) )
+    Ekin_max = E.max()
+    sqfac  = 0.51231673320067676965494 # sqrt ( 2m / hbar^2), see deg2kz()
+
+    _d2k = lambda deg: sqfac * np.sqrt(Ekin_max)*np.sin(deg*np.pi/180.0)
+    return (_d2k (np.array([ideg_d[0], ideg_d[-1]])),
+            _d2k (np.array([ideg_t[0], ideg_t[-1]])))
+
+
+def _deg2ky_coords (E, ideg_d, ideg_t):
+    '''
+    Returns the (detector, tilt) index coordinates in the input data for
+    the rectangular (E, k_detector, k_tilt) output grid of deg2ky(), and
+    the map of points that have no valid coordinates (they're set to 0,
+    use the map to clean up the data later). The detector coordinates
+    don't depend on the tilt and have the shape (E, d, 1), the others
+    are full-size.
+    *E* are the kinetic energies, *ideg_d* and *ideg_t* the angle axes.
+    The returned arrays are cached, shared and read-only.
+    '''
+    key = tuple(np.asarray(x, dtype=float).tobytes() for x in (E, ideg_d, ideg_t))
+    if key in _deg2ky_cache:
+        return _deg2ky_cache[key]
+
+    sqfac  = 0.51231673320067676965494 # sqrt ( 2m / hbar^2), see deg2kz()
+    ik_d_lim, ik_t_lim = _deg2ky_klim (E, ideg_d, ideg_t)
+
+    # rectangular, evenly-spaced grid in k coordinates, as 1D axes
+    # that numpy broadcasts against each other on the fly
+    oe  = E[:,None,None]
+    okd = np.linspace (start = ik_d_lim[0],
+                       stop  = ik_d_lim[1],
+                       num   = len(ideg_d))[None,:,None]
+    okt = np.linspace (start = ik_t_lim[0], 
+                       stop  = ik_t_lim[1],
+                       num   = len(ideg_t))[None,None,:]
+
+    # Reverse transformations (see notes in deg2kz()). The detector
+    # angle doesn't depend on the tilt, so only odeg_t is full-size.
+    _ksq   = np.sqrt (oe)
+    _ksq  *= sqfac                            # (E, 1, 1)
+    odeg_d = np.divide (okd, _ksq)            # (E, d, 1)
+    np.arcsin (odeg_d, out=odeg_d)            # !!! here, this is still in rad
+    odeg_t = np.divide (okt, _ksq * np.cos (odeg_d))
+    np.arcsin (odeg_t, out=odeg_t)
+    odeg_t *= 180.0/np.pi                     # deg
+    odeg_d *= (180.0 / 3.1415926535)          # conversion rad->deg
+
+    # Some of the coordinates above may end up as NaNs and choke the
+    # interpolator. Map the positions and clean-up the data later.
+    nan_map  = np.isnan(odeg_t)
+    nan_map |= np.isnan(odeg_d)
+
+    # map_coordinates() takes index coordinates.
+    ocoord_d = odeg_d
+    ocoord_d -= ideg_d[0]
+    ocoord_d /= ((ideg_d[-1]-ideg_d[0])/len(ideg_d))
+    ocoord_t = odeg_t
+    ocoord_t -= ideg_t[0]
+    ocoord_t /= ((ideg_t[-1]-ideg_t[0])/len(ideg_t))
+
+    # Index 0 (i.e. ideg_d[0] and ideg_t[0]) are safe
+    # polar coordinates to use with the interpolator.
+    ocoord_d[np.isnan(ocoord_d)] = 0.0
+    ocoord_t[nan_map] = 0.0
+
+    entry = (ocoord_d, ocoord_t, nan_map)
+    for a in entry:
+        a.setflags (write=False)
+
+    # drop the oldest entries to make room (entries that
+    # don't fit into the cache at all are not kept)
+    size = sum(a.nbytes for a in entry)
+    while len(_deg2ky_cache) and \
+          size + sum(a.nbytes for v in _deg2ky_cache.values() for a in v) > _deg2ky_cache_bytes:
+        del _deg2ky_cache[next(iter(_deg2ky_cache))]
+    if size <= _deg2ky_cache_bytes:
+        _deg2ky_cache[key] = entry
+
+    return entry
+
+
 def deg2ky (*args, **kwargs):
     '''
     Converts a 3D wave from the natural coordinates of an ARPES
@@ -688,9 +853,7 @@ def deg2ky (*args, **kwargs):
     #  . ...
 
     # parameter helpers
-    _param = lambda k0, k1, d: \
-      kwargs[k0] if k0 in kwargs \
-      else (kwargs[k1] if k1 in kwargs else d)
+    _param = lambda k0, k1, d: kwargs.get(k0, kwargs.get(k1, d))
 
     if args[0].ndim != 3:
         raise ValueError ("Input has to be a 3D array of values. "
@@ -722,70 +885,43 @@ def deg2ky (*args, **kwargs):
     # detector offset -- convenience option
     ideg_d += doffs
     
-    # This is the maximum kinetic energy available *in* *the* *data*
-    # (which is usually larger than the Fermi level :-) )
-    Ekin_max = E.max()
-
-    # some constants (see deg2kz() for details)
-    hsq_2m = 3.80998194907763662131527 # hbar^2 / 2me
-    m2_hsq = 0.26246843511741342307750 # 2me / hbar^2
-    sqfac  = 0.51231673320067676965494 # sqrt ( 2m / hbar^2)
-    
-    _d2k = lambda deg, Ekin:  sqfac * np.sqrt(Ekin_max)*np.sin(deg*np.pi/180.0)
-
     # axes limits of the k-space data
-    ik_d_lim = _d2k (np.array([ideg_d[0], ideg_d[-1]]), Ekin_max)
-    ik_t_lim = _d2k (np.array([ideg_t[0], ideg_t[-1]]), Ekin_max)
+    ik_d_lim, ik_t_lim = _deg2ky_klim (E, ideg_d, ideg_t)
     if isinstance (idata, wave.Wave):
         odata.dim[1].lim = ik_d_lim
         odata.dim[2].lim = ik_t_lim
     
 
-    # rectangular, evenly-spaced grid in k coordinates
-    oe, okd, okt = np.broadcast_arrays (E[:,None,None],
-                                        np.linspace (start = ik_d_lim[0],
-                                                     stop  = ik_d_lim[1],
-                                                     num   = len(ideg_d))[None,:,None],
-                                        np.linspace (start = ik_t_lim[0], 
-                                                     stop  = ik_t_lim[1],
-                                                     num   = len(ideg_t))[None,None,:])
-
-
     print("done.")
 
     print("Calculating reverse coordinates... ", end=' ')
     log.info ("Calculating reverse coordinates")
-    
-    # Reverse transformations: this is where the magic happens
-    # (see notes above). Everything else is just house keeping. :-)
-    odeg_d = np.arcsin (okd / (sqfac*np.sqrt(oe)) )  # !!! here, this is still in rad
-    odeg_t = np.arcsin (okt / (sqfac*np.sqrt(oe)*np.cos(odeg_d )) ) * 180.0/np.pi # deg
-    odeg_d *= (180.0 / 3.1415926535)  # conversion rad->deg
 
-    # Some of the coordinates above may end up as NaNs and choke the
-    # interpolator. Map the positions and clean-up the data later.
-    nan_map = np.isnan(odeg_d) + np.isnan(odeg_t)
-    odeg_d[nan_map] = ideg_d[0] # safe polar coordinates to...
-    odeg_t[nan_map] = ideg_t[0] # ...use with the interpolator.
+    # Reverse transformations: this is where the magic happens
+    # (see notes above and _deg2ky_coords()). Everything else is
+    # just house keeping. :-)
+    ocoord_d, ocoord_t, nan_map = _deg2ky_coords (E, ideg_d, ideg_t)
     print("done.")
 
-    
     print("Interpolating data... ", end=' ')
     log.info ("Interpolating")
-    
-    # map_coordinates() takes index coordinates.
-    ocoord_index = np.broadcast_arrays (np.arange(idata.dim[0].size)[:,None,None],
-                                        (odeg_d - ideg_d[0]) / ((ideg_d[-1]-ideg_d[0])/len(ideg_d)),
-                                        (odeg_t - ideg_t[0]) / ((ideg_t[-1]-ideg_t[0])/len(ideg_t)))
-                                        #idata.dim[1].x2i(odeg_d),
-                                        #idata.dim[2].x2i(odeg_t))
 
     mode = 'constant'
     if 'force_wrap_mode' in kwargs and kwargs['force_wrap_mode'] == True:
         mode = 'wrap'
-        
-    spni.map_coordinates (idata, ocoord_index, output=odata.view(np.ndarray),
-                          order=degree, mode=mode, cval=fill)
+
+    # The energy coordinates are exactly the input indices, so every
+    # energy slice only needs a 2D interpolation in (detector, tilt).
+    # The spline prefilter is applied once, to the whole stack, along
+    # these two axes only.
+    ipf = idata.view(np.ndarray)
+    if degree > 1:
+        ipf = spni.spline_filter1d (ipf, degree, axis=1, output=np.float64)
+        ipf = spni.spline_filter1d (ipf, degree, axis=2, output=np.float64)
+
+    for ipf_e, odat, od, ot in zip(ipf, odata.view(np.ndarray), ocoord_d, ocoord_t):
+        spni.map_coordinates (ipf_e, (np.broadcast_to(od, ot.shape), ot), output=odat,
+                              order=degree, mode=mode, cval=fill, prefilter=False)
 
     print("done.")
     
@@ -1051,9 +1187,7 @@ def deg2kz (*args, **kwargs):
 
 
     # parameter helpers
-    _param = lambda k0, k1, d: \
-      kwargs[k0] if k0 in kwargs \
-      else (kwargs[k1] if k1 in kwargs else d)
+    _param = lambda k0, k1, d: kwargs.get(k0, kwargs.get(k1, d))
 
     if args[0].ndim != 3:
         raise ValueError ("Input has to be a 3D array of values. "
@@ -493,15 +493,31 @@ class ViewerWindow(QtGui.QMainWindow):
             return
 
         log.debug ("File list: %s" % str(flist))
-        data = []
-        for fname in flist:
-            d = igor.load (fname)
-            d.info.setdefault('name', os.path.basename(str(fname)))
-            d.info.setdefault('tmp', {})
-            d.info['tmp']['last path'] = str(fname)
-            self.pscr.toolbar.path_ref = str(fname)
-            self.plot.files = list(flist)
-            data.append (d)
+        self.plotLoaded (flist, [self.loadFile(fname) for fname in flist])
+
+
+    @staticmethod
+    def loadFile(fname):
+        '''
+        Loads the specified data file and returns it as a Wave.
+        Doesn't touch the GUI, so it's safe to call from
+        a worker thread (see *plotLoaded()*).
+        '''
+        d = igor.load (fname)
+        d.info.setdefault('name', os.path.basename(str(fname)))
+        d.info.setdefault('tmp', {})
+        d.info['tmp']['last path'] = str(fname)
+        return d
+
+
+    def plotLoaded(self, flist, data):
+        '''
+        Plots the waves *data*, previously loaded from the
+        files *flist* by *loadFile()*.
+        '''
+        if len(flist):
+            self.pscr.toolbar.path_ref = str(flist[-1])
+        self.plot.files = list(flist)
         self.plotWaves (data)
 
 